@@ -332,6 +332,9 @@ def main():
     plots_parser.add_argument('--no_tikztrees', dest='tikztrees', action='store_false', help='Generate Tikz trees?')
     parser.set_defaults(tikztrees=True)
 
+    parser.add_argument('--singlecore', action='store_true',
+                        help="Write plots in the main process instead of a pool of worker processes (for debugging).")
+
     parser.add_argument('--benchmarking', action='store_true', help="Generate mutation matrix for benchmarking.")
 
     parser.add_argument('-b', '--boot', help='Number of bootstrapping samples', type=int,
@@ -472,6 +475,10 @@ def main():
         logger.error('Subclone and partial solution space search are not supported to be performed at the same time! ')
         usage()
 
+    if (plots_report or plots_paper) and not args.singlecore:
+        # write figures to files in the background
+        plts.init_plot_pool(settings.PLOT_PROCESSES)
+
     if os.getcwd().endswith('treeomics'):
         # application has been started from this directory
         input_directory = os.path.join('..')
@@ -879,6 +886,10 @@ def main():
     else:
         raise RuntimeError("No mode was provided (e.g. -m 1) to infer the phylogenetic tree.")
 
+    # wait until all plots have been written by the worker processes
+    # as they are embedded in the PDF version of the HTML report
+    plts.wait_for_figures()
+
     # finalize HTML report
     html_report.end_report(patient.bi_error_rate, patient.bi_c0, patient.max_absent_vaf, settings.LOH_FREQUENCY,
                            fpr, fdr, min_absent_cov, args.min_median_coverage, args.min_median_vaf,
@@ -889,4 +900,8 @@ def main():
 
 if __name__ == '__main__':
 
-    main()
+    try:
+        main()
+    finally:
+        # write figures still queued in the plot pool if the analysis terminated early
+        plts.wait_for_figures()
@@ -1,16 +1,21 @@
 """Visualize various data"""
 import logging
+import multiprocessing as mp
+import pickle
 import numpy as np
 from collections import defaultdict
+from functools import lru_cache
 from itertools import cycle
 import scipy.cluster.hierarchy as sch
-import matplotlib.pyplot as plt
 import matplotlib as mpl
+# plots are only written to files, use the non-interactive Agg backend
+mpl.use('Agg')
+import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.collections import PolyCollection, LineCollection
 from matplotlib.cm import ScalarMappable
 import pandas as pd
 import seaborn as sns
-from copy import deepcopy
 import math
 from utils.statistics import calculate_present_pvalue, calculate_absent_pvalue
 from matplotlib import rcParams
@@ -31,6 +36,14 @@ rcParams['font.family'] = 'sans-serif'
 rcParams['font.sans-serif'] = ['Arial']
 sns.set_style("whitegrid", {'grid.color': '0.8', "axes.edgecolor": "0.0"})
 
+# pool of worker processes writing figures to files in the background (None: figures are saved in the main process)
+_plot_pool = None
+# results of figures submitted to the plot pool which have not yet been written
+_pending_figures = []
+
+# colors of absent (0), unknown (1), and present (3) variants indexed by their status weight in mutation tables
+STATUS_COLORS = mpl.colors.to_rgba_array([(1.0, 0.3, 0.3), (0.9, 0.75, 0.75), (0.9, 0.75, 0.75), 'blue'])
+
 
 def bayesian_hinton(log_p01, output_directory, filename, row_labels=None, column_labels=None,
                     displayed_mutations=None, put_driver_vars=None):
@@ -103,9 +116,10 @@ def bayesian_hinton(log_p01, output_directory, filename, row_labels=None, column
 
     edge_color = 'black'
 
-    for x_pos, mut_idx in enumerate(sorted(displayed_mutations,
-                                           key=lambda k: (-priorities[k],
-                                                          column_labels[k] if column_labels is not None else 0))):
+    sorted_muts = sorted(displayed_mutations,
+                         key=lambda k: (-priorities[k], column_labels[k] if column_labels is not None else 0))
+    face_colors = []
+    for mut_idx in sorted_muts:
 
         for sa_idx, (log_prob0, _) in enumerate(log_p01[mut_idx]):
             p0 = math.exp(log_prob0)
@@ -157,9 +171,15 @@ def bayesian_hinton(log_p01, output_directory, filename, row_labels=None, column
             else:     # mutation is most likely absent
                 color = colors[22]
 
-            rect = plt.Rectangle([x_pos * width, (height+y_spacing) * (len(log_p01[mut_idx]) - sa_idx - 1)],
-                                 width, height, facecolor=color, edgecolor=edge_color, linewidth=1.0)
-            ax.add_patch(rect)
+            face_colors.append(color)
+
+    # draw all cells of the table as a single collection
+    n_samples = len(log_p01[sorted_muts[0]]) if len(sorted_muts) else 0
+    rects = PolyCollection(_rectangle_vertices(np.arange(len(sorted_muts))[:, np.newaxis] * width,
+                                               (height+y_spacing) * np.arange(n_samples-1, -1, -1), width, height),
+                           facecolors=face_colors, edgecolors=edge_color, linewidths=1.0,
+                           joinstyle='miter')
+    ax.add_collection(rects, autolim=False)
 
     if row_labels is not None:
         for sa_idx, row_name in enumerate(row_labels):
@@ -167,8 +187,7 @@ def bayesian_hinton(log_p01, output_directory, filename, row_labels=None, column
                     horizontalalignment='right', verticalalignment='bottom', fontsize=12)
 
     if column_labels is not None:
-        for x_pos, mut_idx in enumerate(sorted(displayed_mutations,
-                                               key=lambda k: (-priorities[k], column_labels[k]))):
+        for x_pos, mut_idx in enumerate(sorted_muts):
 
             # number of supporting sources
             c = ((Driver.colors()[len(put_driver_vars[mut_idx].sources)] if Driver.MaxSourceSupport > 0
@@ -181,20 +200,17 @@ def bayesian_hinton(log_p01, output_directory, filename, row_labels=None, column
                     weight=('bold' if put_driver_vars is not None and mut_idx in put_driver_vars and
                             put_driver_vars[mut_idx].cgc_driver else 'normal'))     # is in CGC
 
-    ax.autoscale_view()
+    _set_table_limits(ax, len(sorted_muts) * width, n_samples * (height+y_spacing) - y_spacing)
     # fig.tight_layout()
     ax.set_axis_off()
     fig.add_axes(ax)
 
-    plt.savefig(os.path.join(output_directory, filename+'.pdf'), dpi=150,
-                bbox_inches='tight', transparent=True)
-    plt.savefig(os.path.join(output_directory, filename+'.png'), dpi=150,
-                bbox_inches='tight', transparent=True)
-
-    logger.info('Generated bayesian mutation table plot: {}'.format(filename+'.pdf'))
+    _save_figure(fig, [os.path.join(output_directory, filename+'.pdf'),
+                       os.path.join(output_directory, filename+'.png')], dpi=150, transparent=True,
+                 log_msg='Generated bayesian mutation table plot: {}'.format(filename+'.pdf'))
 
     # plt.show(block=True)
-    plt.close()
+    plt.close(fig)
 
 
 def _create_colorbar(output_directory):
@@ -237,20 +253,18 @@ def _create_colorbar(output_directory):
 
     norm = mpl.colors.Normalize(vmin=0.0, vmax=1.0)
 
-    cb1 = mpl.colorbar.ColorbarBase(ax, cmap=lscmap, norm=norm, orientation='vertical', ticks=[0, 0.25, 0.5, 0.75, 1.0])
+    scalar_map = ScalarMappable(norm=norm, cmap=lscmap)
+
+    cb1 = fig.colorbar(scalar_map, cax=ax, orientation='vertical', ticks=[0, 0.25, 0.5, 0.75, 1.0])
     cb1.ax.tick_params(labelsize=11)
     cb1.ax.yaxis.set_ticks_position('left')
     cb1.ax.set_yticklabels(['< 0.01', '0.1', '0.5', '0.9', '> 0.99'])
     cb1.set_label('Prob. of presence', size=12)
 
-    scalar_map = ScalarMappable(norm=norm, cmap=lscmap)
-
-    plt.savefig(os.path.join(output_directory, 'colorbar_variant_presences'+'.pdf'),
-                dpi=150, bbox_inches='tight', transparent=True)
-    plt.savefig(os.path.join(output_directory, 'colorbar_variant_presences'+'.png'),
-                dpi=150, bbox_inches='tight', transparent=True)
+    _save_figure(fig, [os.path.join(output_directory, 'colorbar_variant_presences'+'.pdf'),
+                       os.path.join(output_directory, 'colorbar_variant_presences'+'.png')], dpi=150, transparent=True)
 
-    plt.close()
+    plt.close(fig)
 
     return scalar_map
 
@@ -281,7 +295,7 @@ def hinton(data, filename, row_labels=None, column_labels=None, displayed_mutati
     y_length = len(data[0]) * (height+y_spacing) - y_spacing + (label_y_pos + 20 if column_labels is not None else 0)
 
     # create new figure
-    plt.figure(figsize=(x_length / 20.0, y_length / 20.0), dpi=150)
+    fig = plt.figure(figsize=(x_length / 20.0, y_length / 20.0), dpi=150)
 
     ax = plt.axes([0, 1, 1, 1])
 
@@ -291,40 +305,26 @@ def hinton(data, filename, row_labels=None, column_labels=None, displayed_mutati
     ax.yaxis.set_major_locator(plt.NullLocator())
 
     # sort mutation table according to status
-    priorities = [0 for _ in range(len(data))]
-    for mut_idx in displayed_mutations:
-        for sa_idx, maf in enumerate(data[mut_idx]):
-            if maf > 0:     # mutation is present
-                priorities[mut_idx] += 3 * (4 ** (len(data[mut_idx])-sa_idx-1))
-            elif maf == POS_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                priorities[mut_idx] += 1 * (4 ** (len(data[mut_idx])-sa_idx-1))
-            elif maf == NEG_UNKNOWN:
-                priorities[mut_idx] += 1 * (4 ** (len(data[mut_idx])-sa_idx-1))
-            else:
-                priorities[mut_idx] += 0 * (4 ** (len(data[mut_idx])-sa_idx-1))
+    mut_data = np.array([data[mut_idx] for mut_idx in displayed_mutations], dtype=float).reshape(
+        len(displayed_mutations), len(data[0]))
+    weights = _status_weights(mut_data)
+    priorities = np.zeros(len(data), dtype=object)
+    priorities[displayed_mutations] = _status_priorities(weights)
 
     edge_color = 'black'
 
-    for x_pos, mut_idx in enumerate(sorted(displayed_mutations,
-                                           key=lambda k: (-priorities[k],
-                                                          column_labels[k] if column_labels is not None else 0))):
-
-        for sa_idx, maf in enumerate(data[mut_idx]):
-            if maf > 0:     # mutation is present
-                color = 'blue'
-            elif maf == POS_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                color = (0.9, 0.75, 0.75)
-            elif maf == NEG_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                color = (0.9, 0.75, 0.75)
-            else:
-                color = (1.0, 0.3, 0.3)
+    order = sorted(range(len(displayed_mutations)),
+                   key=lambda row: (-priorities[displayed_mutations[row]],
+                                    column_labels[displayed_mutations[row]] if column_labels is not None else 0))
+    sorted_muts = [displayed_mutations[row] for row in order]
+    weights = weights[order]
 
-            rect = plt.Rectangle([x_pos * width, (height+y_spacing) * (len(data[mut_idx]) - sa_idx - 1)], width, height,
-                                 facecolor=color, edgecolor=edge_color)
-            ax.add_patch(rect)
+    # draw all cells of the table as a single collection
+    rects = PolyCollection(_rectangle_vertices(np.arange(weights.shape[0])[:, np.newaxis] * width,
+                                               (height+y_spacing) * np.arange(weights.shape[1]-1, -1, -1),
+                                               width, height),
+                           facecolors=STATUS_COLORS[weights.ravel()], edgecolors=edge_color, joinstyle='miter')
+    ax.add_collection(rects, autolim=False)
 
     if row_labels is not None:
         for sa_idx, row_name in enumerate(row_labels):
@@ -332,20 +332,18 @@ def hinton(data, filename, row_labels=None, column_labels=None, displayed_mutati
                     horizontalalignment='right', verticalalignment='bottom', fontsize=12)
 
     if column_labels is not None:
-        for x_pos, mut_idx in enumerate(sorted(displayed_mutations,
-                                               key=lambda k: (-priorities[k], column_labels[k]))):
+        for x_pos, mut_idx in enumerate(sorted_muts):
 
             ax.text(x_pos * width+(width/2)+0.2, label_y_pos+(height+y_spacing) * (len(data[mut_idx])),
                     _format_gene_name(column_labels[mut_idx], max_length=12),
                     rotation='vertical', horizontalalignment='center', verticalalignment='bottom', fontsize=8,
                     color='red' if drivers is not None and column_labels[mut_idx] in drivers else 'black')
 
-    ax.autoscale_view()
+    _set_table_limits(ax, weights.shape[0] * width, weights.shape[1] * (height+y_spacing) - y_spacing)
 
-    plt.savefig(filename+'.pdf', dpi=150, bbox_inches='tight', transparent=True)
-    plt.savefig(filename+'.png', dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated mutation table plot: {}'.format(filename+'.pdf'))
+    _save_figure(fig, [filename+'.pdf', filename+'.png'], dpi=150, transparent=True,
+                 log_msg='Generated mutation table plot: {}'.format(filename+'.pdf'))
+    plt.close(fig)
 
     # plt.show(block=True)
 
@@ -416,53 +414,56 @@ def create_incompatible_mp_table(patient, filename, phylogeny, row_labels=None,
     absent_color = (1.0, 0.3, 0.3)
     unknown_color = (0.9, 0.75, 0.75)
 
-    for x_pos, mut_idx in enumerate(
-            sorted(displayed_mutations, key=lambda k: (column_labels[k].lower() if column_labels is not None else k))):
-
-        for sa_idx, (p0, p1) in enumerate(patient.log_p01[mut_idx]):
-
-            cov = float(patient.coverage[patient.mut_keys[mut_idx]][patient.sample_names[sa_idx]])
-            if cov > 0:
-                raw_maf = (float(patient.mut_reads[patient.mut_keys[mut_idx]][patient.sample_names[sa_idx]]) / cov)
-            else:
-                raw_maf = 0.0
-
-            if p1 > conf_clas_lpth:     # mutation is present
-                class_color = present_color
-            elif p0 > conf_clas_lpth:   # mutation is absent
-                class_color = absent_color
-            else:                       # mutation can not be classified according to the Bayesian inference model
-                class_color = unknown_color
-
-            maf_color = plt.cm.Blues(2.0 * raw_maf if raw_maf < 0.5 else 1.0)
-            cov_color = plt.cm.Greens(math.log(cov, 10)/3 if 0 < cov < 1000 else 0.0 if cov <= 0.0 else 1.0)
-
-            rect_maf = plt.Rectangle([(x_pos * width * 3) + 0,
-                                      (height+y_spacing) * (len(patient.data[mut_idx]) - sa_idx - 1)],
-                                     width, height, linewidth=0, facecolor=maf_color)
-            rect_cov = plt.Rectangle([(x_pos * width * 3) + 1,
-                                      (height+y_spacing) * (len(patient.data[mut_idx]) - sa_idx - 1)],
-                                     width, height, linewidth=0, facecolor=cov_color)
-            box = plt.Rectangle([(x_pos * width * 3), (height+y_spacing) * (len(patient.data[mut_idx]) - sa_idx - 1)],
-                                width*2, height, linewidth=4, facecolor=None, edgecolor=class_color, clip_on=False)
-            ax.add_patch(box)
-            ax.add_patch(rect_maf)
-            ax.add_patch(rect_cov)
-
-            if isinstance(phylogeny, MaxLHPhylogeny):
-                if mut_idx in opt_sol.false_positives.keys() and \
-                        sa_idx in opt_sol.false_positives[mut_idx]:
-
-                    af = plt.Rectangle([(x_pos * width * 3), (height+y_spacing) *
-                                        (len(patient.data[mut_idx]) - sa_idx - 1)],
-                                       width*2, height/2, facecolor=absent_color, linewidth=0)
-                    ax.add_patch(af)
+    sorted_muts = sorted(displayed_mutations,
+                         key=lambda k: (column_labels[k].lower() if column_labels is not None else k))
+    n_samples = len(patient.sample_names)
+
+    coverage, mut_reads = _read_count_matrices(patient, sorted_muts)
+    raw_mafs = np.divide(mut_reads, coverage, out=np.zeros_like(coverage), where=coverage > 0)
+    log_covs = np.log10(coverage, out=np.zeros_like(coverage), where=coverage > 0)
+    maf_colors = plt.cm.Blues(np.minimum(2.0 * raw_mafs, 1.0).ravel())
+    cov_colors = plt.cm.Greens(np.minimum(log_covs / 3, 1.0).ravel())
+
+    # classification according to the Bayesian inference model: present, absent, or unknown
+    log_p01 = np.array([patient.log_p01[mut_idx] for mut_idx in sorted_muts], dtype=float).reshape(
+        len(sorted_muts), n_samples, 2)
+    class_colors = np.where((log_p01[:, :, 1] > conf_clas_lpth).ravel()[:, np.newaxis],
+                            mpl.colors.to_rgba(present_color),
+                            np.where((log_p01[:, :, 0] > conf_clas_lpth).ravel()[:, np.newaxis],
+                                     mpl.colors.to_rgba(absent_color), mpl.colors.to_rgba(unknown_color)))
+
+    # lower left corners of the cells
+    x_pos = np.arange(len(sorted_muts))[:, np.newaxis] * width * 3
+    y_pos = (height+y_spacing) * np.arange(n_samples-1, -1, -1)
+
+    # draw each layer of the table as a single collection
+    boxes = PolyCollection(_rectangle_vertices(x_pos, y_pos, width*2, height),
+                           facecolors='none', edgecolors=class_colors, linewidths=4, joinstyle='miter')
+    boxes.set_clip_on(False)
+    ax.add_collection(boxes, autolim=False)
+    ax.add_collection(PolyCollection(_rectangle_vertices(x_pos, y_pos, width, height),
+                                     facecolors=maf_colors, linewidths=0), autolim=False)
+    ax.add_collection(PolyCollection(_rectangle_vertices(x_pos + 1, y_pos, width, height),
+                                     facecolors=cov_colors, linewidths=0), autolim=False)
+
+    # putative artifacts are highlighted in the lower half of a cell
+    if isinstance(phylogeny, MaxLHPhylogeny):
+        af_pos = []
+        af_colors = []
+        for x_idx, mut_idx in enumerate(sorted_muts):
+            for sa_idx in range(n_samples):
+                if mut_idx in opt_sol.false_positives.keys() and sa_idx in opt_sol.false_positives[mut_idx]:
+                    af_pos.append((x_pos[x_idx, 0], y_pos[sa_idx]))
+                    af_colors.append(absent_color)
 
                 elif mut_idx in opt_sol.false_negatives.keys() and sa_idx in opt_sol.false_negatives[mut_idx]:
-                    af = plt.Rectangle([(x_pos * width * 3), (height+y_spacing) *
-                                        (len(patient.data[mut_idx]) - sa_idx - 1)],
-                                       width*2, height/2, facecolor=present_color, linewidth=0)
-                    ax.add_patch(af)
+                    af_pos.append((x_pos[x_idx, 0], y_pos[sa_idx]))
+                    af_colors.append(present_color)
+
+        if len(af_pos):
+            af_pos = np.array(af_pos, dtype=float)
+            ax.add_collection(PolyCollection(_rectangle_vertices(af_pos[:, 0], af_pos[:, 1], width*2, height/2),
+                                             facecolors=af_colors, linewidths=0), autolim=False)
 
     if row_labels is not None:
         for sa_idx, row_name in enumerate(row_labels):
@@ -470,8 +471,7 @@ def create_incompatible_mp_table(patient, filename, phylogeny, row_labels=None,
                     horizontalalignment='right', verticalalignment='bottom', fontsize=12)
 
     if column_labels is not None:
-        for x_pos, mut_idx in enumerate(sorted(displayed_mutations,
-                                               key=lambda k: (column_labels[k].lower()))):
+        for x_pos, mut_idx in enumerate(sorted_muts):
 
             ax.text(x_pos * width * 3 + width+0.1, label_y_pos+(height+y_spacing) * (len(patient.data[mut_idx])),
                     _format_gene_name(column_labels[mut_idx], max_length=12),
@@ -483,7 +483,7 @@ def create_incompatible_mp_table(patient, filename, phylogeny, row_labels=None,
     cmap = cm.Blues
     norm = mpl.colors.Normalize(vmin=0, vmax=0.5)
 
-    cb1 = mpl.colorbar.ColorbarBase(ax1, cmap=cmap, norm=norm, orientation='vertical')
+    cb1 = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), cax=ax1, orientation='vertical')
     cb1.ax.tick_params(labelsize=8)
     cb1.ax.yaxis.set_ticks_position('left')
     cb1.set_label('VAF')
@@ -493,18 +493,18 @@ def create_incompatible_mp_table(patient, filename, phylogeny, row_labels=None,
     # Set the colormap and norm to correspond to the data for which the colorbar will be used.
     cmap = cm.Greens
 
-    cb2 = mpl.colorbar.ColorbarBase(ax2, cmap=cmap, norm=mpl.colors.LogNorm(vmin=1, vmax=1000), orientation='vertical')
+    cb2 = fig.colorbar(ScalarMappable(norm=mpl.colors.LogNorm(vmin=1, vmax=1000), cmap=cmap), cax=ax2,
+                       orientation='vertical')
     cb2.ax.tick_params(labelsize=8)
     cb2.ax.yaxis.set_ticks_position('left')
     cb2.set_label('Coverage')
 
-    ax.autoscale_view()
+    _set_table_limits(ax, (len(sorted_muts)-1) * width * 3 + width * 2, n_samples * (height+y_spacing) - y_spacing)
 
-    plt.savefig(filename+'.pdf', dpi=150, bbox_inches='tight', transparent=True)
-    plt.savefig(filename+'.png', bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated illustrative mutation table plot of incompatible mutation patterns: {}'.format(
-        filename+'.pdf'))
+    _save_figure(fig, [filename+'.pdf', filename+'.png'], dpi=150, transparent=True,
+                 log_msg='Generated illustrative mutation table plot of incompatible mutation patterns: {}'.format(
+                     filename+'.pdf'))
+    plt.close(fig)
 
     return x_length, y_length
 
@@ -557,9 +557,9 @@ def vaf_distribution_plot(filename, patient):
             ax_vaf.text(sa_idx, 1.08, '{:.0%}'.format(df_vafs[df_vafs > 0].median()[sa_idx]),
                         horizontalalignment='center', fontsize=9, color='red', rotation=45)
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated violinplot for VAF distribution {}'.format(filename))
+    _save_figure(fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated violinplot for VAF distribution {}'.format(filename))
+    plt.close(fig)
 
 
 def coverage_plot(filename, patient, max_cov=None):
@@ -611,9 +611,9 @@ def coverage_plot(filename, patient, max_cov=None):
                     horizontalalignment='center', fontsize=9, rotation=45,
                     color=('black' if df_cov.median()[sa_idx] >= 100 else 'red'))
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated coverage distribution plot {}'.format(filename))
+    _save_figure(fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated coverage distribution plot {}'.format(filename))
+    plt.close(fig)
 
 
 def boxplot(filename, patient):
@@ -629,7 +629,7 @@ def boxplot(filename, patient):
     data = []
     upper_labels = []    # number of mutations
     for sample_name in patient.sample_names:
-        data.append(patient.sample_mafs[sample_name])
+        data.append(np.asarray(patient.sample_mafs[sample_name]))
         upper_labels.append(len(patient.sample_mafs[sample_name]))
 
     plt.boxplot(data, notch=0, showfliers=False, sym='+', vert=1, whis=1.5, meanprops=meanpointprops,
@@ -643,16 +643,17 @@ def boxplot(filename, patient):
     # caption = 'Mutant allele frequency (MAF) distribution in the DNA samples of {}. '.format(patient.name)
     # bp_fig.text(0, -0.2, caption,
     #                horizontalalignment='left', color='black', fontsize=10)
-    for sa_idx, sample_name in enumerate(patient.sample_names):
-        # bp_ax.text(sa_idx+1, 0.93, len(patient.sample_mafs[sample_name]),
+    median_coverages = [np.median(patient.sample_phred_coverages[sample_name])
+                        for sample_name in patient.sample_names]
+    for sa_idx, median_coverage in enumerate(median_coverages):
+        # bp_ax.text(sa_idx+1, 0.93, len(data[sa_idx]),
         #            horizontalalignment='center', color='#707070', fontsize=9)
-        bp_ax.text(sa_idx+1, 0.93, '{}x'.format(np.median(patient.sample_phred_coverages[sample_name])),
-                   horizontalalignment='center', fontsize=9,
-                   color=('black' if np.median(patient.sample_phred_coverages[sample_name]) >= 100 else 'red'))
+        bp_ax.text(sa_idx+1, 0.93, '{}x'.format(median_coverage), horizontalalignment='center', fontsize=9,
+                   color=('black' if median_coverage >= 100 else 'red'))
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated boxplot for mutant allele frequencies {}'.format(filename))
+    _save_figure(bp_fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated boxplot for mutant allele frequencies {}'.format(filename))
+    plt.close(bp_fig)
 
 
 def reads_plot(filename, patient):
@@ -666,25 +667,13 @@ def reads_plot(filename, patient):
     # each sample in a different color
     sc_fig, sc_ax = plt.subplots(figsize=(len(patient.sample_mafs)*0.56, 4))
 
-    x_coverages = []
-    y_mut_reads = []
-    colors = []
-
-    for mut_key in patient.mut_reads.keys():
-        for sa_idx, sample_name in enumerate(patient.mut_reads[mut_key].keys(), 0):
+    coverage, mut_reads = _read_count_matrices(patient, range(len(patient.mut_keys)))
+    x_coverages = np.where(coverage > 0, coverage, 1).ravel()
+    y_mut_reads = np.where(mut_reads != 0, mut_reads, 1).ravel()
+    sample_colors = plt.cm.jet(np.arange(patient.n) / max(patient.n - 1, 1))
+    colors = np.tile(sample_colors, (len(patient.mut_keys), 1))
 
-            if patient.coverage[mut_key][sample_name] > 0:
-                x_coverages.append(patient.coverage[mut_key][sample_name])
-            else:
-                x_coverages.append(1)
-            if patient.mut_reads[mut_key][sample_name]:
-                y_mut_reads.append(patient.mut_reads[mut_key][sample_name])
-            else:
-                y_mut_reads.append(1)
-
-            colors.append(plt.cm.jet(1. * sa_idx / (patient.n - 1)))
-
-    plt.scatter(x_coverages, y_mut_reads, c=colors, s=10, marker="x")
+    plt.scatter(x_coverages, y_mut_reads, c=colors, s=10, marker="x", rasterized=True)
 
     sc_ax.set_xscale('log')
     sc_ax.set_xlim([1, 10000])
@@ -694,7 +683,8 @@ def reads_plot(filename, patient):
     sc_ax.set_ylabel('Variant reads')
     sc_ax.set_title(patient.name)
 
-    plt.show(block=False)
+    # draw the figure to generate the tick labels
+    sc_fig.canvas.draw()
     x_labels = [item.get_text() for item in sc_ax.get_xticklabels()]
     # x_labels[1] = r'$\leq 10^0$'
     # x_labels[1] = '$\\mathdefault{\leq 10^{0}}$'
@@ -715,9 +705,9 @@ def reads_plot(filename, patient):
     # draw line at a frequency of 10%
     plt.plot([1, 10000], [0.1, 1000], 'k:', color='black', lw=1)
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated scatter plot about sequencing reads {}'.format(filename))
+    _save_figure(sc_fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated scatter plot about sequencing reads {}'.format(filename))
+    plt.close(sc_fig)
 
     # plt.show(block=True)
 
@@ -773,71 +763,49 @@ def clustered_table(filename, patient, clusters, row_labels=None, column_labels=
     ax_hin.yaxis.set_major_locator(plt.NullLocator())
 
     # sort mutation table according to clustering and status
-    priorities = [0 for _ in range(len(patient.data))]
-    leave_ordering = deepcopy(den['leaves'])    # leave ordering based on the results of the clustering
-    leave_ordering.reverse()
-    for mut_idx in displayed_mutations:
-        for i in range(len(patient.data[mut_idx])):
-
-            sa_idx = int(leave_ordering[i])
-            maf = patient.data[mut_idx][sa_idx]
-
-            if maf > 0:     # mutation is present
-                priorities[mut_idx] += 3 * (4 ** (len(patient.data[mut_idx])-i-1))
-            elif maf == POS_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                priorities[mut_idx] += 1 * (4 ** (len(patient.data[mut_idx])-i-1))
-            elif maf == NEG_UNKNOWN:
-                priorities[mut_idx] += 1 * (4 ** (len(patient.data[mut_idx])-i-1))
-            else:
-                priorities[mut_idx] += 0 * (4 ** (len(patient.data[mut_idx])-i-1))
+    # leave ordering based on the results of the clustering
+    leave_ordering = np.asarray(den['leaves'], dtype=int)[::-1]
+    mut_data = np.array([patient.data[mut_idx] for mut_idx in displayed_mutations], dtype=float).reshape(
+        len(displayed_mutations), len(patient.data[0]))
+    weights = _status_weights(mut_data[:, leave_ordering])
+    priorities = np.zeros(len(patient.data), dtype=object)
+    priorities[displayed_mutations] = _status_priorities(weights)
 
     edge_color = 'black'
-    for x_pos, mut_idx in enumerate(sorted(displayed_mutations, key=lambda k: (-priorities[k],
-                                                                               patient.gene_names[k]))):
-
-        for i in range(len(patient.data[mut_idx])):
-
-            sa_idx = leave_ordering[i]
-            maf = patient.data[mut_idx][sa_idx]
-
-            if maf > 0:     # mutation is present
-                color = 'blue'
-            elif maf == POS_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                color = (0.9, 0.75, 0.75)
-            elif maf == NEG_UNKNOWN:
-                # merge the two unknown categories when variants are displayed
-                color = (0.9, 0.75, 0.75)
-            else:
-                color = (1.0, 0.3, 0.3)
-
-            rect = plt.Rectangle([x_pos * width, (height+y_spacing) * (len(patient.data[mut_idx]) - i - 1)],
-                                 width, height, facecolor=color, edgecolor=edge_color)
-            ax_hin.add_patch(rect)
+    order = sorted(range(len(displayed_mutations)),
+                   key=lambda row: (-priorities[displayed_mutations[row]],
+                                    patient.gene_names[displayed_mutations[row]]))
+    sorted_muts = [displayed_mutations[row] for row in order]
+    weights = weights[order]
+
+    # draw all cells of the table as a single collection
+    rects = PolyCollection(_rectangle_vertices(np.arange(weights.shape[0])[:, np.newaxis] * width,
+                                               (height+y_spacing) * np.arange(weights.shape[1]-1, -1, -1),
+                                               width, height),
+                           facecolors=STATUS_COLORS[weights.ravel()], edgecolors=edge_color, joinstyle='miter')
+    ax_hin.add_collection(rects, autolim=False)
 
     # add sample name labels
     if row_labels is not None:
-        for i, sa_idx in enumerate(reversed(den['leaves'])):
+        for i, sa_idx in enumerate(leave_ordering):
             ax_hin.text(label_x_pos, (height+y_spacing) * (len(row_labels) - i - 1)+0.5,
                         row_labels[sa_idx].replace('_', ' '),
                         horizontalalignment='right', verticalalignment='bottom', fontsize=12)
 
     # add mutation gene name labels
     if column_labels is not None:
-        for x_pos, mut_idx in enumerate(sorted(displayed_mutations, key=lambda k: (-priorities[k],
-                                                                                   patient.gene_names[k]))):
+        for x_pos, mut_idx in enumerate(sorted_muts):
 
             ax_hin.text(x_pos * width+0.5, label_y_pos+(height+y_spacing) * (len(patient.data[mut_idx])),
                         _format_gene_name(patient.gene_names[mut_idx], max_length=12),
                         rotation='vertical', horizontalalignment='left', verticalalignment='bottom', fontsize=8)
 
-    ax_dg.autoscale_view()
-    ax_hin.autoscale_view()
+    # the dendrogram sets the limits of its axes itself
+    _set_table_limits(ax_hin, weights.shape[0] * width, weights.shape[1] * (height+y_spacing) - y_spacing)
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated combined mutation table and dendrogram {}'.format(filename))
+    _save_figure(fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated combined mutation table and dendrogram {}'.format(filename))
+    plt.close(fig)
 
     # plt.show(block=True)
 
@@ -850,20 +818,17 @@ def p_value_present_plot(filename, patient, false_positive_rate):
     """
     bp_fig, bp_ax = plt.subplots(figsize=(5.6, 3))
 
-    x_values = []
-    y_values = []
+    coverage, mut_reads = _read_count_matrices(patient, range(len(patient.mut_keys)))
+    sample_ys = np.broadcast_to(patient.n - np.arange(patient.n), coverage.shape)
 
-    for mut_key in patient.mut_reads.keys():
-        for sa_idx, sample_name in enumerate(patient.mut_reads[mut_key].keys(), 0):
-            if patient.mut_reads[mut_key][sample_name] > 0:
-                present_p_value = math.log(calculate_present_pvalue(patient.mut_reads[mut_key][sample_name],
-                                                                    patient.coverage[mut_key][sample_name],
-                                                                    false_positive_rate), 10)
-                x_values.append(present_p_value)
-                y_values.append(patient.n-sa_idx)
-                # colors.append(plt.cm.jet(1. * sa_idx / (patient.n - 1)))
+    present = mut_reads > 0
+    p_values = calculate_present_pvalue(mut_reads[present], coverage[present], false_positive_rate)
+    # p-values of zero lie beyond the left end of the log-scaled axis
+    shown = p_values > 0
+    x_values = np.log10(p_values[shown])
+    y_values = sample_ys[present][shown]
 
-    plt.scatter(x_values, y_values, c='black', s=10, marker="x")
+    plt.scatter(x_values, y_values, c='black', s=10, marker="x", rasterized=True)
 
     bp_ax.set_xlim([-5, 0])
     # bp_ax.set_xlabel('$\\mathdefault{\log_{10} \ (\mathrm{p-value})}$')
@@ -878,9 +843,9 @@ def p_value_present_plot(filename, patient, false_positive_rate):
 
     bp_ax.set_yticklabels(y_labels)
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated scatter plot about p-values of possibly present variants {}'.format(filename))
+    _save_figure(bp_fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated scatter plot about p-values of possibly present variants {}'.format(filename))
+    plt.close(bp_fig)
 
 
 def p_value_absent_plot(filename, patient, min_maf):
@@ -892,26 +857,20 @@ def p_value_absent_plot(filename, patient, min_maf):
     # create plot with the p-values in each sample
     bp_fig, bp_ax = plt.subplots(figsize=(5.6, 3))
 
-    x_values = []
-    y_values = []
-    # colors = []
-
-    for mut_idx in range(len(patient.mut_keys)):
-        mut_key = patient.mut_keys[mut_idx]
-        for sa_idx, sample_name in enumerate(patient.sample_names):
-
-            # don't show p-values for variants classified as present
-            if patient.data[mut_idx][sa_idx] > 0:    # mutation has been classified as present
-                continue
+    coverage, mut_reads = _read_count_matrices(patient, range(len(patient.mut_keys)))
+    sample_ys = np.broadcast_to(patient.n - np.arange(patient.n), coverage.shape)
 
-            absent_p_value = math.log(calculate_absent_pvalue(patient.mut_reads[mut_key][sample_name],
-                                                              patient.coverage[mut_key][sample_name], min_maf),
-                                      10)
-            x_values.append(absent_p_value)
-            y_values.append(patient.n-sa_idx)
-            # colors.append(plt.cm.jet(1. * sa_idx / (patient.n - 1)))
+    # don't show p-values for variants classified as present
+    mut_data = np.array([patient.data[mut_idx] for mut_idx in range(len(patient.mut_keys))],
+                        dtype=float).reshape(coverage.shape)
+    not_present = mut_data <= 0
+    p_values = calculate_absent_pvalue(mut_reads[not_present], coverage[not_present], min_maf)
+    # p-values of zero lie beyond the left end of the log-scaled axis
+    shown = p_values > 0
+    x_values = np.log10(p_values[shown])
+    y_values = sample_ys[not_present][shown]
 
-    plt.scatter(x_values, y_values, c='black', s=10, marker="x")
+    plt.scatter(x_values, y_values, c='black', s=10, marker="x", rasterized=True)
 
     bp_ax.set_xlim([-5, 0])
     #bp_ax.set_xlabel('$\\mathdefault{\log_{10} \ (\mathrm{p-value})}$')
@@ -927,9 +886,9 @@ def p_value_absent_plot(filename, patient, min_maf):
     bp_ax.set_yticklabels(y_labels)
     bp_ax.legend(loc='lower left', fontsize=10, frameon=True)
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated scatter plot about p-values of possibly absent variants {}'.format(filename))
+    _save_figure(bp_fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated scatter plot about p-values of possibly absent variants {}'.format(filename))
+    plt.close(bp_fig)
 
 
 def robustness_plot(filename, comp_node_frequencies):
@@ -953,8 +912,13 @@ def robustness_plot(filename, comp_node_frequencies):
                                              key=lambda k: -k[1])):
             mp_ids[node] = mp_id
 
+    # connect the frequencies of each pattern in consecutive fractions
+    segments = []
+    segment_colors = []
     last_fraction = None
     for sample_fraction in sorted(comp_node_frequencies.keys()):
+        fraction_colors = plt.cm.jet(np.arange(len(mp_ids)) /
+                                     max(len(comp_node_frequencies[sample_fraction].keys()) - 1, 1))
         for node, _ in sorted(comp_node_frequencies[sample_fraction].items(), key=lambda k: -k[1]):
 
             x_values[mp_ids[node]].append(sample_fraction/100.0)
@@ -962,20 +926,20 @@ def robustness_plot(filename, comp_node_frequencies):
 
             if (last_fraction is not None and node in comp_node_frequencies[last_fraction]
                     and node in comp_node_frequencies[sample_fraction]):
-                plt.plot([last_fraction/100.0, sample_fraction/100.0],
-                         [comp_node_frequencies[last_fraction][node],
-                          comp_node_frequencies[sample_fraction][node]],
-                         'k:', lw=1,
-                         color=plt.cm.jet(1. * mp_ids[node] / (len(comp_node_frequencies[sample_fraction].keys()) - 1)))
+                segments.append([(last_fraction/100.0, comp_node_frequencies[last_fraction][node]),
+                                 (sample_fraction/100.0, comp_node_frequencies[sample_fraction][node])])
+                segment_colors.append(fraction_colors[mp_ids[node]])
 
         last_fraction = sample_fraction
 
+    ax.add_collection(LineCollection(segments, colors=segment_colors, linestyles=':', linewidths=1))
+
+    mp_colors = plt.cm.jet(np.arange(len(x_values.keys())) / max(len(x_values.keys()) - 1, 1))
     plots = dict()
     for node, mp_id in sorted(mp_ids.items(), key=lambda k: k[1]):
-        plots[mp_id] = plt.scatter(x_values[mp_id], y_values[mp_id],
-                                   c=plt.cm.jet(1. * mp_id / (len(x_values.keys()) - 1)),
+        plots[mp_id] = plt.scatter(x_values[mp_id], y_values[mp_id], c=mp_colors[mp_id][np.newaxis],
                                    s=15, marker=next(markers), facecolors='none',
-                                   edgecolors=plt.cm.jet(1. * mp_id / (len(x_values.keys()) - 1)), label='present')
+                                   edgecolors=mp_colors[mp_id][np.newaxis], label='present')
     plt.legend(plots.values(),
                [','.join(str(s) for s in node) for node, _ in sorted(mp_ids.items(), key=lambda k: k[1])],
                scatterpoints=1, loc='lower right', fontsize=8)
@@ -986,15 +950,191 @@ def robustness_plot(filename, comp_node_frequencies):
     ax.set_ylim([0.0, 1.0])
     ax.set_ylabel('Mutation pattern robustness')
 
-    plt.savefig(filename, dpi=150, bbox_inches='tight', transparent=True)
-    plt.close()
-    logger.info('Generated scatter plot about the mutation pattern robustness {}'.format(filename))
+    _save_figure(fig, [filename], dpi=150, transparent=True,
+                 log_msg='Generated scatter plot about the mutation pattern robustness {}'.format(filename))
+    plt.close(fig)
+
+
+def init_plot_pool(n_processes):
+    """
+    Start a pool of worker processes which write the generated figures to files
+    such that rendering is no longer on the critical path of the analysis
+    Matplotlib is not thread-safe, hence processes are spawned instead of threads
+    :param n_processes: number of worker processes
+    """
+    global _plot_pool
+
+    if _plot_pool is None and n_processes > 0:
+        _plot_pool = mp.get_context('spawn').Pool(processes=n_processes)
+        logger.debug('Started pool of {} processes to write plots.'.format(n_processes))
+
+
+def wait_for_figures():
+    """
+    Wait until all figures submitted to the plot pool have been written and shut the pool down
+    """
+    global _plot_pool
+
+    try:
+        # errors of the worker processes are only raised here and not at the call of the plot function
+        for result in _pending_figures:
+            result.get()
+    finally:
+        del _pending_figures[:]
+
+        if _plot_pool is not None:
+            _plot_pool.close()
+            _plot_pool.join()
+            _plot_pool = None
+
+
+def _save_figure(fig, filepaths, log_msg=None, **kwargs):
+    """
+    Save the given figure to the given files
+    If a plot pool was started, the figure is serialized and written by a worker process
+    :param fig: matplotlib figure
+    :param filepaths: list of paths to the output files
+    :param log_msg: message logged once the files have been written
+    :param kwargs: further arguments passed to savefig
+    """
+
+    if _plot_pool is None:
+        _write_figure(fig, filepaths, **kwargs)
+        if log_msg is not None:
+            logger.info(log_msg)
+    else:
+        # message is logged by the main process when the worker has finished
+        _pending_figures.append(_plot_pool.apply_async(
+            _render_and_save, (pickle.dumps(fig), filepaths, kwargs),
+            callback=(lambda _: logger.info(log_msg)) if log_msg is not None else None))
+
+
+def _render_and_save(fig_data, filepaths, kwargs):
+    """
+    Restore a serialized figure and write it to the given files (executed by the worker processes of the plot pool)
+    :param fig_data: pickled matplotlib figure
+    :param filepaths: list of paths to the output files
+    :param kwargs: further arguments passed to savefig
+    """
+
+    fig = pickle.loads(fig_data)
+    _write_figure(fig, filepaths, **kwargs)
+    plt.close(fig)
+
+
+def _write_figure(fig, filepaths, **kwargs):
+    """
+    Write the given figure to the given files with a tight bounding box
+    For multiple files the tight bounding box is computed once from a single rendering and reused
+    (bbox_inches='tight' would render the figure twice per file)
+    :param fig: matplotlib figure
+    :param filepaths: list of paths to the output files
+    :param kwargs: further arguments passed to savefig
+    """
+
+    if len(filepaths) == 1:
+        fig.savefig(filepaths[0], bbox_inches='tight', **kwargs)
+        return
+
+    # the box is measured with the Agg renderer, text extents in vector formats may differ marginally
+    fig.canvas.draw()
+    bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(rcParams['savefig.pad_inches'])
+    for filepath in filepaths:
+        fig.savefig(filepath, bbox_inches=bbox, **kwargs)
+
+
+def _read_count_matrices(patient, mut_idxs):
+    """
+    Collect the coverage and the number of variant reads of the given mutations in all samples
+    :param patient: instance of class patient
+    :param mut_idxs: list of mutation indices (rows of the matrices)
+    :return: tuple of 2-dimensional arrays (coverage, variant reads) with the samples as columns
+    """
+
+    shape = (len(mut_idxs), len(patient.sample_names))
+    coverage = np.array([[patient.coverage[patient.mut_keys[mut_idx]][sample_name]
+                          for sample_name in patient.sample_names] for mut_idx in mut_idxs], dtype=float)
+    mut_reads = np.array([[patient.mut_reads[patient.mut_keys[mut_idx]][sample_name]
+                           for sample_name in patient.sample_names] for mut_idx in mut_idxs], dtype=float)
+
+    return coverage.reshape(shape), mut_reads.reshape(shape)
+
+
+def _status_weights(mut_data):
+    """
+    Classify the status of the mutations in each sample: 3...present, 1...unknown, 0...absent
+    :param mut_data: 2-dimensional array with the mutation data (rows: mutations, columns: samples)
+    :return: 2-dimensional integer array with the status weights
+    """
+
+    return np.where(mut_data > 0, 3, np.where((mut_data == POS_UNKNOWN) | (mut_data == NEG_UNKNOWN), 1, 0))
+
+
+def _status_priorities(weights):
+    """
+    Calculate the sorting priorities of the mutations in a table according to their status in the samples
+    Status weights are encoded in base 4 such that the first sample is the most significant digit
+    :param weights: 2-dimensional array with the status weights (rows: mutations, columns: samples)
+    :return: array with the priority of each mutation (row)
+    """
+
+    n_samples = weights.shape[1]
+    # base 4 encoding exceeds 64 bit integers for more than 31 samples, fall back to python integers
+    powers = 4 ** np.arange(n_samples-1, -1, -1, dtype=np.int64 if n_samples < 32 else object)
+
+    return np.dot(weights.astype(powers.dtype), powers)
+
+
+def _rectangle_vertices(x_pos, y_pos, width, height):
+    """
+    Generate the vertices of rectangles to be drawn as a single PolyCollection
+    Given positions are broadcast against each other such that a table can be described by
+    a column vector of x-coordinates and a row vector of y-coordinates
+    :param x_pos: x-coordinates of the lower left corners
+    :param y_pos: y-coordinates of the lower left corners
+    :param width: width of the rectangles
+    :param height: height of the rectangles
+    :return: array of shape (number of rectangles, 4, 2) with the corners of the rectangles
+    """
+
+    x_pos, y_pos = np.broadcast_arrays(np.asarray(x_pos, dtype=float), np.asarray(y_pos, dtype=float))
+    x_pos = x_pos.ravel()
+    y_pos = y_pos.ravel()
+
+    vertices = np.empty((len(x_pos), 4, 2))
+    vertices[:, 0, 0] = vertices[:, 1, 0] = x_pos
+    vertices[:, 2, 0] = vertices[:, 3, 0] = x_pos + width
+    vertices[:, 0, 1] = vertices[:, 3, 1] = y_pos
+    vertices[:, 1, 1] = vertices[:, 2, 1] = y_pos + height
+
+    return vertices
+
+
+def _set_table_limits(ax, x_max, y_max):
+    """
+    Set the view limits of a table to the known extent of its cells plus the default margins
+    Same limits as autoscaling but without computing the data limits of all cells
+    :param ax: axes of the table
+    :param x_max: right edge of the last column of cells (left edge of the first column is at 0)
+    :param y_max: upper edge of the first row of cells (lower edge of the last row is at 0)
+    """
+
+    # keep the default limits of an empty table as autoscaling would
+    if x_max <= 0 or y_max <= 0:
+        return
+
+    x_margin = rcParams['axes.xmargin'] * x_max
+    y_margin = rcParams['axes.ymargin'] * y_max
+    ax.set_xlim(-x_margin, x_max + x_margin)
+    ax.set_ylim(-y_margin, y_max + y_margin)
 
 
+@lru_cache(maxsize=None)
 def _format_gene_name(gene_name, max_length=20):
     """
     Check the format of the gene name
     Replace apostrophes if necessary and shorten the name
+    Results are cached as variants in the same gene share their name
     :param gene_name: name of the gene
     :param max_length: hard length limit
     :return: formatted gene name
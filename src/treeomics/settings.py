@@ -88,6 +88,9 @@ COMMON_VARS_FILE = 'input/ExAC/ExAC_sites_0_001.csv'
 # ########################## OUTPUT CONFIGURATIONS #################################
 OUTPUT_FOLDER = 'output'    # path to output folder for all files
 
+# number of worker processes writing plots to files in the background (0: plots are written by the main process)
+PLOT_PROCESSES = 2
+
 # depending on various display settings, one has to play with the zoom to get a PDF report with a decent font size
 ZOOM = 1.0
 